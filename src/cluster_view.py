@@ -301,6 +301,13 @@ class ClusterPanedView(Gtk.Paned):
         self.stack.add_named(self.registry_settings, "registry_page")
         self.stack.add_named(self.network_settings, "ports_page")
         self.stack.add_named(self.advanced_settings, "advanced_page")
+
+        for page in (self.general_settings,
+                     self.registry_settings,
+                     self.network_settings,
+                     self.advanced_settings):
+            page.finalize()
+
         self.stack.set_transition_type(Gtk.StackTransitionType.CROSSFADE)
         self.stack.set_transition_duration(100)
 
@@ -315,9 +322,9 @@ class ClusterPanedView(Gtk.Paned):
 ###############################################################################
 
 class GeneralSettingsPage(SettingsPage):
-    _managed_settings = [
-        "last-num-workers",
-    ]
+    _settings_widgets = {
+        "last-num-workers": "num_workers",
+    }
 
     def __init__(self, settings: ApplicationSettings, **kwargs):
         self.cluster = kwargs.pop("cluster", None)
@@ -346,7 +353,7 @@ class GeneralSettingsPage(SettingsPage):
             "but you can start extra workers in cluster for having something "
             "more similar to a production cluster.")
         self.num_workers.props.hexpand = False
-        self.append_labeled_entry("Number of workers", self.num_workers, setting="last-num-workers")
+        self.append_labeled_entry("Number of workers", self.num_workers)
 
         if self.cluster:
             box = Gtk.Box(spacing=6)
@@ -397,9 +404,9 @@ class GeneralSettingsPage(SettingsPage):
 ###############################################################################
 
 class RegistrySettingsPage(SettingsPage):
-    _managed_settings = [
-        "last-enable-registry",
-    ]
+    _settings_widgets = {
+        "last-enable-registry": "enable_registry_checkbutton",
+    }
 
     def __init__(self, settings: ApplicationSettings, **kwargs):
         self.cluster = kwargs.pop("cluster", None)
@@ -417,9 +424,7 @@ class RegistrySettingsPage(SettingsPage):
             "that will be created on-demand. You will be able to push to this "
             "registry from your laptop, and images will be available "
             "in the Kubernetes cluster.")
-        self.append_labeled_entry("Enable local registry:",
-                                  self.enable_registry_checkbutton,
-                                  setting="last-enable-registry")
+        self.append_labeled_entry("Enable local registry:", self.enable_registry_checkbutton)
 
         # Disable everything if the cluster already exists
         if self.cluster is not None:
@@ -433,9 +438,9 @@ class RegistrySettingsPage(SettingsPage):
 ###############################################################################
 
 class NetworkSettingsPage(SettingsPage):
-    _managed_settings = [
-        "last-api-address",
-    ]
+    _settings_widgets = {
+        "last-api-address": "api_binding_entry",
+    }
 
     def __init__(self, settings: ApplicationSettings, **kwargs):
         self.cluster = kwargs.pop("cluster", None)
@@ -454,8 +459,7 @@ class NetworkSettingsPage(SettingsPage):
             "API server binding address and port. It can be "
             "[host:]port. (where a port 0 means a random port). "
             "Examples: ':6443', '0.0.0.0:6443'")
-        self.append_labeled_entry("API address/port:", self.api_binding_entry,
-                                  setting="last-api-address")
+        self.append_labeled_entry("API address/port:", self.api_binding_entry)
 
         # Disable everything if the cluster already exists
         if self.cluster is not None:
@@ -469,9 +473,9 @@ class NetworkSettingsPage(SettingsPage):
 ###############################################################################
 
 class AdvancedSettingsPage(SettingsPage):
-    _managed_settings = [
-        "last-install-dashboard",
-    ]
+    _settings_widgets = {
+        "last-install-dashboard": "install_dashboard",
+    }
 
     def __init__(self, settings: ApplicationSettings, **kwargs):
         self.cluster = kwargs.pop("cluster", None)
@@ -486,7 +490,7 @@ class AdvancedSettingsPage(SettingsPage):
         self.install_dashboard = Gtk.Switch()
         self.install_dashboard.set_tooltip_text(
             "When enabled, installs the Dashboard after creating the cluster.")
-        self.append_labeled_entry("Install Dashboard:", self.install_dashboard, setting="last-install-dashboard")
+        self.append_labeled_entry("Install Dashboard:", self.install_dashboard)
 
         # Disable everything if the cluster already exists
         if self.cluster is not None:
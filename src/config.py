@@ -26,6 +26,7 @@ import logging
 import os
 from pathlib import Path
 from shutil import copyfile
+from typing import Dict
 
 from gi.repository import GLib, Gtk, Gio
 
@@ -128,6 +129,7 @@ class ApplicationSettings(object):
             # Changes the Settings object into ‘delay-apply’ mode. In this mode,
             # changes to self are not immediately propagated to the backend, but kept
             # locally until Settings.apply() is called.
+            # Note that apply() and revert() do not leave this mode, so it is only entered here.
             # https://lazka.github.io/pgi-docs/Gio-2.0/classes/Settings.html#Gio.Settings.delay
             logging.debug("Creating settings in delayed mode...")
             self._settings.delay()
@@ -142,9 +144,11 @@ class ApplicationSettings(object):
         self._settings.sync()
 
     def revert(self) -> None:
+        if not self._settings.get_has_unapplied():
+            return
         logging.debug(f"[SETTINGS] Reverting changes in settings")
+        # note: no need to sync(), as reverting does not write anything to the backend
         self._settings.revert()
-        self._settings.sync()
 
     def get_safe_string(self, key: str) -> str:
         """
@@ -166,6 +170,13 @@ class ApplicationSettings(object):
             key = f"key-{key}"
         return self.get_safe_string(key)
 
+    def get_all_keybindings(self) -> Dict[str, str]:
+        """
+        Get all the keybindings, indexed by the keybinding ID (ie, without the "key-" prefix)
+        """
+        keys = self._settings.props.settings_schema.list_keys()
+        return {key[len("key-"):]: self.get_safe_string(key) for key in keys if key.startswith("key-")}
+
     @staticmethod
     def get_config_dir() -> str:
         """
@@ -287,6 +298,9 @@ DEFAULT_API_SERVER_PORT_RANGE = (6500, 7500)
 # list of invalid chars in a Docker container or volume name
 DEFAULT_INVALID_CHARS_DOCKER_NAME = [",", " ", "/", "[", "]"]
 
+# max time for resolving the registry name when validating the preferences (in milliseconds)
+DEFAULT_REGISTRY_RESOLVE_TIMEOUT = 2000
+
 # preferences window size
 DEFAULT_PREFS_WIDTH = 650
 DEFAULT_PREFS_HEIGHT = 450
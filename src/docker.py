@@ -23,6 +23,7 @@
 # SOFTWARE.
 
 
+import functools
 import logging
 from typing import Optional
 
@@ -31,6 +32,7 @@ from .config import SETTINGS_KEY_DOCKER_ENDPOINT, DEFAULT_INVALID_CHARS_DOCKER_N
 from .utils_ui import show_notification
 
 
+@functools.lru_cache(maxsize=128)
 def is_valid_docker_name(name: str) -> bool:
     """
     Returns True if the given name is a valid Docker container/volume name
@@ -131,11 +131,12 @@ class HelmChart(object):
                 outfile.write("\n---\n")
                 outfile.write(manifest + "\n")
 
-        with open(self.file, 'r') as infile:
-            logging.debug(f"[CHART] Chart file contents on {self.file}")
-            lines = infile.readlines()
-            for line in lines:
-                logging.debug(f"[CHART] " + line.rstrip())
+        # do not even read the file when it is not going to be logged
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            with open(self.file, 'r') as infile:
+                logging.debug(f"[CHART] Chart file contents on {self.file}")
+                for line in infile.read().splitlines():
+                    logging.debug("[CHART] %s", line.rstrip())
 
         return self.file
 
@@ -37,7 +37,7 @@ from .config import (DEFAULT_EXTRA_PATH,
                      DEFAULT_K3D_WAIT_TIME)
 from .docker import DockerController
 from .helm import HelmChart, cleanup_for_owner
-from .utils import (call_in_main_thread,
+from .utils import (emit_in_main_thread,
                     find_unused_port_in_range,
                     parse_or_get_address,
                     find_executable,
@@ -249,7 +249,7 @@ class K3dCluster(GObject.GObject):
             while True:
                 try:
                     line = next(run_k3d_command("create", *args, **kwargs))
-                    logging.debug(f"[K3D] {line}")
+                    logging.debug("[K3D] %s", line)
 
                     # detect errors in the output
                     if "level=fatal" in line:
@@ -265,7 +265,7 @@ class K3dCluster(GObject.GObject):
         logging.info("[K3D] The cluster has been created")
         self._status = "running"
 
-        call_in_main_thread(lambda: self.emit("created", self.name))
+        emit_in_main_thread(self, "created", self.name)
 
     def destroy(self) -> None:
         """
@@ -286,13 +286,13 @@ class K3dCluster(GObject.GObject):
         while True:
             try:
                 line = next(run_k3d_command("delete", *args))
-                logging.debug(f"[K3D] {line}")
+                logging.debug("[K3D] %s", line)
             except StopIteration:
                 break
 
         self._cleanup()
         self._destroyed = True
-        call_in_main_thread(lambda: self.emit("destroyed", self.name))
+        emit_in_main_thread(self, "destroyed", self.name)
 
     def _cleanup(self) -> None:
         """
@@ -339,7 +339,7 @@ class K3dCluster(GObject.GObject):
             while True:
                 try:
                     line = next(run_k3d_command("start", *args))
-                    logging.debug(f"[K3D] {line}")
+                    logging.debug("[K3D] %s", line)
                 except StopIteration:
                     break
 
@@ -352,7 +352,7 @@ class K3dCluster(GObject.GObject):
             while True:
                 try:
                     line = next(run_k3d_command("stop", *args))
-                    logging.debug(f"[K3D] {line}")
+                    logging.debug("[K3D] %s", line)
                 except StopIteration:
                     break
 
@@ -18,11 +18,13 @@
 
 import logging
 import os
+import queue
 import ssl
 import subprocess
+import threading
 import urllib.error
 import urllib.request
-from typing import Dict, Union
+from typing import Dict, Tuple, Union
 from typing import Optional
 
 from gi.repository import GObject
@@ -37,9 +39,7 @@ from .k3d import (K3dCluster,
 from .kubectl import (merge_kubeconfigs_to,
                       kubectl_set_current_context,
                       kubectl_get_current_context)
-from .utils import (call_in_main_thread,
-                    emit_in_main_thread,
-                    call_periodically,
+from .utils import (emit_in_main_thread,
                     truncate_file,
                     run_hook_script, ScriptError)
 from .utils_ui import show_notification, show_error_dialog
@@ -49,6 +49,63 @@ K3D_LIST_HEADER_LEN = 3
 K3D_LIST_FOOTER_LEN = 1
 
 
+###############################################################################
+# a cache for the clusters
+###############################################################################
+
+class ClusterStateCache(object):
+    """
+    A thread-safe cache of the current clusters
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clusters: Dict[str, K3dCluster] = dict()
+        self._names: Tuple[str, ...] = tuple()
+        self._signature = hash(self._names)
+
+    def update(self, clusters: Dict[str, K3dCluster]) -> None:
+        """
+        Replace the clusters in the cache
+        """
+        names = tuple(sorted(clusters))
+        with self._lock:
+            self._clusters = dict(clusters)
+            if names != self._names:
+                self._names = names
+                self._signature = hash(names)
+
+    def snapshot(self) -> Dict[str, K3dCluster]:
+        """
+        Returns a copy of the clusters, indexed by name
+        """
+        with self._lock:
+            return dict(self._clusters)
+
+    def get(self, name: str) -> Optional[K3dCluster]:
+        """
+        Returns the cluster with the given name, or None if it is not known
+        """
+        with self._lock:
+            return self._clusters.get(name)
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        """
+        Returns the (sorted) names of the clusters
+        """
+        with self._lock:
+            return self._names
+
+    @property
+    def signature(self) -> int:
+        """
+        Returns a signature of the clusters names
+        """
+        with self._lock:
+            return self._signature
+
+
 ###############################################################################
 # the k3d clusters controller
 ###############################################################################
@@ -69,15 +126,18 @@ class K3dController(GObject.GObject):
 
     def __init__(self, settings: ApplicationSettings, docker: DockerController, **kwargs):
         super().__init__(*kwargs)
-        self.clusters = dict()
+        self._cache = ClusterStateCache()
         self._settings = settings
         self._docker = docker
         self._active = None
 
-        # refresh the list of clusters cached, and schedule a periodic update
+        # refresh the list of clusters cached in a worker thread, that also does a periodic update
+        # note: all the changes in the kubeconfig (merges, `use-context`...) are done in this thread
         logging.debug("[K3D] Initializing K3DController...")
+        self._refresh_requests = queue.Queue()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="K3dRefresh", daemon=True)
+        self._refresh_thread.start()
         self.refresh(initial=True)
-        call_periodically(DEFAULT_K3D_LIST_UPDATE_INTERVAL, self.refresh)
 
     def _k3d_list(self) -> Dict[str, K3dCluster]:
         """
@@ -118,6 +178,27 @@ class K3dController(GObject.GObject):
 
         return cs
 
+    @property
+    def clusters(self) -> Dict[str, K3dCluster]:
+        """
+        Returns a snapshot of the current clusters, indexed by name
+        """
+        return self._cache.snapshot()
+
+    @property
+    def clusters_names(self) -> Tuple[str, ...]:
+        """
+        Returns the (sorted) names of the current clusters
+        """
+        return self._cache.names
+
+    @property
+    def clusters_signature(self) -> int:
+        """
+        Returns a signature of the current set of clusters, that changes when clusters are added or removed
+        """
+        return self._cache.signature
+
     @property
     def active(self) -> Optional[K3dCluster]:
         """
@@ -127,8 +208,12 @@ class K3dController(GObject.GObject):
 
     @active.setter
     def active(self, new_cluster: Union[K3dCluster, str]) -> None:
+        # the activation is done in the refresh thread, so the caller (ie, the main thread) never blocks
+        self._refresh_requests.put((self._set_active, (new_cluster,)))
+
+    def _set_active(self, new_cluster: Union[K3dCluster, str]) -> None:
         if new_cluster is None:
-            if len(self.clusters) > 0:
+            if len(self._cache.names) > 0:
                 logging.debug("[K3D] No active cluster")
 
             if self._active is not None:
@@ -138,7 +223,7 @@ class K3dController(GObject.GObject):
 
         new_cluster_name = new_cluster.name if isinstance(new_cluster, K3dCluster) else new_cluster
 
-        if new_cluster_name not in self.clusters:
+        if self._cache.get(new_cluster_name) is None:
             logging.info(f"[K3D] Active cluster '{new_cluster_name}' is not known: probably not a K3D cluster")
             if self._active is not None:
                 emit_in_main_thread(self, "change-current-cluster", None)
@@ -274,7 +359,36 @@ class K3dController(GObject.GObject):
                                       header=f"Script error", icon="dialog-error", is_error=True)
                     logging.exception(f"Cluster {name} post-creation script '{post_destroy_hook}' failed: {e}.")
 
-    def refresh(self, initial=False, active_cluster: Optional[K3dCluster] = None) -> bool:
+    def refresh(self, initial=False, active_cluster: Optional[K3dCluster] = None) -> None:
+        """
+        Request a refresh of the list of clusters. The refresh will be done in the background.
+        """
+        self._refresh_requests.put((self._do_refresh, (initial, active_cluster)))
+
+    def _refresh_loop(self) -> None:
+        """
+        Run the requests (refreshes and activations), or refresh the clusters periodically when there are no requests
+
+        NOTE: this method runs in its own Thread
+        """
+        interval = DEFAULT_K3D_LIST_UPDATE_INTERVAL / 1000
+        while True:
+            try:
+                request = self._refresh_requests.get(timeout=interval)
+            except queue.Empty:
+                request = (self._do_refresh, (False, None))
+
+            if request is None:
+                logging.debug("[K3D] Stopping the refresh thread")
+                return
+
+            func, args = request
+            try:
+                func(*args)
+            except Exception as e:
+                logging.exception(f"[K3D] Could not refresh the clusters: {e}")
+
+    def _do_refresh(self, initial=False, active_cluster: Optional[K3dCluster] = None) -> None:
         # more advanced setup:
         #
         # NAME=$(kubectl --kubeconfig=$1 config get-contexts -o name | head -n 1)
@@ -285,78 +399,70 @@ class K3dController(GObject.GObject):
         # KUBECONFIG=~/.kube/config:$1 kubectl config view --flatten > ~/.kube/merged && cp ~/.kube/config ~/.kube/backup && mv ~/.kube/merged ~/.kube/config
         # kubectl config use-context $NAME
 
-        def do_refresh():
-            logging.info("[K3D] Updating list of clusters with 'k3d list'")
-            latest_clusters = self._k3d_list()
-            logging.debug("[K3D] ... {} clusters obtained".format(len(latest_clusters)))
-
-            # save the current cluster, merge all the kubeconfigs and then activate the
-            # same cluster again... in case there was an active cluster
-            cluster_name_to_activate: Optional[str] = None
-            if active_cluster is not None:
-                logging.debug(f"[K3D] Will activate cluster forced cluster {active_cluster.name} later on...")
-                cluster_name_to_activate = active_cluster.name
-            elif initial:
-                cluster_name_to_activate = kubectl_get_current_context(kubeconfig=self.kubeconfig)
-                logging.debug(
-                    f"[K3D] First time we refresh KUBECONFIG: will save currently active cluster {cluster_name_to_activate}...")
-            elif len(self.clusters) > 0 and self.active is not None:
-                cluster_name_to_activate = self.active.name
-                logging.debug(f"[K3D] Saving current cluster {cluster_name_to_activate} for later on...")
-
-            changes = False
-            try:
-                if set(latest_clusters.keys()) != set(self.clusters.keys()) or \
-                        not os.path.exists(self.kubeconfig) or \
-                        initial:
+        logging.info("[K3D] Updating list of clusters with 'k3d list'")
+        latest_clusters = self._k3d_list()
+        logging.debug("[K3D] ... {} clusters obtained".format(len(latest_clusters)))
+
+        # save the current cluster, merge all the kubeconfigs and then activate the
+        # same cluster again... in case there was an active cluster
+        cluster_name_to_activate: Optional[str] = None
+        if active_cluster is not None:
+            logging.debug(f"[K3D] Will activate cluster forced cluster {active_cluster.name} later on...")
+            cluster_name_to_activate = active_cluster.name
+        elif initial:
+            cluster_name_to_activate = kubectl_get_current_context(kubeconfig=self.kubeconfig)
+            logging.debug(
+                f"[K3D] First time we refresh KUBECONFIG: will save currently active cluster {cluster_name_to_activate}...")
+        elif len(self._cache.names) > 0 and self.active is not None:
+            cluster_name_to_activate = self.active.name
+            logging.debug(f"[K3D] Saving current cluster {cluster_name_to_activate} for later on...")
+
+        changes = False
+        try:
+            if tuple(sorted(latest_clusters)) != self._cache.names or \
+                    not os.path.exists(self.kubeconfig) or \
+                    initial:
 
-                    changes = True
+                changes = True
 
-                    cl = len(latest_clusters)
-                    logging.info(f"[K3D] Regenerating kubeconfig at {self.kubeconfig} ({cl} clusters)")
+                cl = len(latest_clusters)
+                logging.info(f"[K3D] Regenerating kubeconfig at {self.kubeconfig} ({cl} clusters)")
 
-                    if len(latest_clusters) > 0:
-                        clusters_kubeconfigs = []
-                        for c in latest_clusters.values():
-                            kubeconfig = c.kubeconfig
-                            if not kubeconfig:
-                                raise NoKubeconfigObtainedError(f"could not get a KUBECONFIG for {c.name}")
-                            clusters_kubeconfigs.append(kubeconfig)
+                if len(latest_clusters) > 0:
+                    clusters_kubeconfigs = []
+                    for c in latest_clusters.values():
+                        kubeconfig = c.kubeconfig
+                        if not kubeconfig:
+                            raise NoKubeconfigObtainedError(f"could not get a KUBECONFIG for {c.name}")
+                        clusters_kubeconfigs.append(kubeconfig)
 
-                        merge_kubeconfigs_to(clusters_kubeconfigs, self.kubeconfig)
-                    else:
-                        truncate_file(self.kubeconfig)
+                    merge_kubeconfigs_to(clusters_kubeconfigs, self.kubeconfig)
+                else:
+                    truncate_file(self.kubeconfig)
 
-            except Exception as e:
-                logging.exception(f"[K3D] Could not update kubeconfig: {e}")
-            finally:
-                self.clusters = latest_clusters
-
-            # update the currently active cluster
-            if cluster_name_to_activate is not None and cluster_name_to_activate in self.clusters:
-                self.active = cluster_name_to_activate
-            else:
-                self.active = kubectl_get_current_context(kubeconfig=self.kubeconfig)
+        except Exception as e:
+            logging.exception(f"[K3D] Could not update kubeconfig: {e}")
+        finally:
+            self._cache.update(latest_clusters)
 
-            if changes:
-                # note: no need of call_in_main_thread for this `emit`, as `inner_refresh` has
-                #       been started with call_in_main_thread
-                self.emit("clusters-changed", len(latest_clusters))
+        # update the currently active cluster
+        if cluster_name_to_activate is not None and cluster_name_to_activate in latest_clusters:
+            self._set_active(cluster_name_to_activate)
+        else:
+            self._set_active(kubectl_get_current_context(kubeconfig=self.kubeconfig))
 
-        call_in_main_thread(do_refresh)
-        return True  # must return True for keeping updating
+        if changes:
+            emit_in_main_thread(self, "clusters-changed", len(latest_clusters))
 
     def get_cluster_by_name(self, name: str) -> Optional[K3dCluster]:
         """
         Get a cluster by a name
         """
-        try:
-            return self.clusters[str(name)]
-        except KeyError as e:
-            return None
+        return self._cache.get(str(name))
 
     def on_quit(self):
         logging.debug("[K3D] Quitting K3D controller")
+        self._refresh_requests.put(None)
 
 
 GObject.type_register(K3dController)
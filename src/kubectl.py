@@ -78,7 +78,7 @@ def merge_kubeconfigs_to(kubeconfigs: List[str], dest: str):
 
         logging.debug("[KUBECTL] KUBECONFIG has {} changes. Printing first lines:".format(len(diff_lines)))
         for line in diff_lines[:8]:
-            logging.debug(f"[KUBECTL] [DIFF]   {line}")
+            logging.debug("[KUBECTL] [DIFF]   %s", line)
 
         logging.debug(f"[KUBECTL] writting new KUBECONFIG to '{dest}'...")
         with open(dest, "w") as out_kubeconfig:
@@ -95,11 +95,22 @@ class Indicator(object):
 
         logging.debug("[MAIN] Creating menu...")
         self._menu = K3dvMenu(controller=self._controller,
+                              settings=self._settings,
                               docker=self._docker,
                               version=self._version)
         self._indicator.set_menu(self._menu)
         self._menu.connect("quit", self.on_quit)
 
+        # Get notified before menu is shown, so we can refresh it only when needed. See:
+        # https://bugs.launchpad.net/screenlets/+bug/522152/comments/15
+        try:
+            self._dbusmenuitem = self._indicator.get_property('dbus-menu-server').get_property('root-node')
+            self._dbusmenuitem.connect('about-to-show', self._menu.on_about_to_show)
+        except Exception as e:
+            logging.warning(f"[MAIN] Could not get notified before the menu is shown: {e}. Will refresh it periodically.")
+        else:
+            self._menu.set_refresh_on_show()
+
         logging.debug("[MAIN] Creating bindings for keyboard shortcuts...")
         self._shortcuts = {
             "New cluster": {
@@ -128,11 +139,6 @@ class Indicator(object):
                               header=f"Keybings registration FAILED",
                               icon="dialog-error", is_error=True)
 
-        # # Get notified before menu is shown, see:
-        # # https://bugs.launchpad.net/screenlets/+bug/522152/comments/15
-        # self._dbusmenuitem = self.indicator.get_property('dbus-menu-server').get_property('root-node')
-        # self._conn = self._dbusmenuitem.connect('about-to-show', self.on_show)
-
         show_notification(f"{APP_TITLE} has been started in the background. Check the k3d icon in the system tray",
                           header=f"{APP_TITLE} started")
 
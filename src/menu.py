@@ -23,12 +23,12 @@
 # SOFTWARE.
 
 import logging
+from contextlib import contextmanager
 
-from gi.repository import Gtk, GdkPixbuf, GObject
+from gi.repository import GLib, Gtk, GdkPixbuf, GObject
 
 from .cluster_view import ClusterDialog
-from .config import (APP_ID,
-                     APP_DESCRIPTION,
+from .config import (APP_DESCRIPTION,
                      APP_TITLE,
                      APP_MAIN_AUTHORS,
                      APP_DOCUMENTERS,
@@ -39,8 +39,7 @@ from .config import ApplicationSettings
 from .k3d import K3dError
 from .k3d_controller import K3dController
 from .preferences import PreferencesDialog
-from .utils import (emit_in_main_thread,
-                    call_periodically,
+from .utils import (call_periodically,
                     call_in_main_thread,
                     running_on_main_thread)
 from .utils_ui import show_notification, show_error_dialog
@@ -48,10 +47,16 @@ from .utils_ui import show_notification, show_error_dialog
 # menu update interval (in milli-seconds)
 MENU_UPDATE_INTERVAL = 10000
 
+# time for coalescing bursts of changes in the clusters (in milli-seconds)
+MENU_CHANGES_DEBOUNCE_INTERVAL = 150
+
 # keyboard shortcuts window dimensions
 KEYBOARD_SHORTCUTS_WINDOW_WIDTH = 500
 KEYBOARD_SHORTCUTS_WINDOW_HEIGHT = 300
 
+# initial value of the last notified active cluster, as `None` means "no cluster active"
+_NOT_NOTIFIED = object()
+
 
 ###############################################################################
 # The menu
@@ -63,49 +68,61 @@ class K3dvMenu(Gtk.Menu):
 
     __gsignals__ = {
         # a signal emmited when we want to quit
-        "quit": (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, (int,)),
+        "quit": (GObject.SignalFlags.RUN_FIRST | GObject.SignalFlags.NO_RECURSE, GObject.TYPE_NONE, ()),
     }
 
-    def __init__(self, controller: K3dController, docker, version, **kwargs):
+    def __init__(self, controller: K3dController, settings: ApplicationSettings, docker, version, **kwargs):
         super().__init__(**kwargs)
 
-        self._settings = ApplicationSettings(APP_ID)
+        self._settings = settings
         self._docker = docker
         self._controller = controller
         self._shortcuts = None
-        self._latest_clusters = dict()
+        self._latest_clusters_names = tuple()
+        self._clusters_signature = None
+        self._refresh_pending_id = 0
+        self._active_pending_id = 0
+        self._active_pending_name = None
+        self._last_active_name = _NOT_NOTIFIED
+        self._quitting = False
         self._version = version
 
         self._controller.connect("clusters-changed", self.on_clusters_changed)
         self._controller.connect("change-current-cluster", self.on_active_cluster_changed)
 
-        self.default_entries = {
-            "New cluster...": (self.on_new_cluster_clicked, None),
-            "New cluster with last settings": (self.on_new_cluster_defaults_clicked, None),
-            "Preferences": (self.on_preferences_clicked, None),
-            "Keyboard shortcuts": (self.on_shortcuts_clicked, None),
-            "About": (self.on_about_clicked, None),
-            "Quit": (self.on_quit_clicked, None),
-        }
-
-        # add the default entries and separator
-        for label, info in self.default_entries.items():
-            connection, icon = info
-            if icon is not None:
-                entry = Gtk.ImageMenuItem.new_from_stock("preferences-system-symbolic", None)
-            else:
-                entry = Gtk.MenuItem(label=label)
-            entry.connect("activate", connection)
-            self.append(entry)
-        self.show_all()
-
-        # create the preferences dialog but do not show it
-        # this `inits` all the bindings that PreferencesDialog.__init__() creates
-        self._preferences = PreferencesDialog(docker=self._docker)
+        self._default_entry_items = (
+            ("New cluster...", self.on_new_cluster_clicked),
+            ("New cluster with last settings", self.on_new_cluster_defaults_clicked),
+            ("Preferences", self.on_preferences_clicked),
+            ("Keyboard shortcuts", self.on_shortcuts_clicked),
+            ("About", self.on_about_clicked),
+            ("Quit", self.on_quit_clicked),
+        )
+        self._default_labels = frozenset(label for label, _ in self._default_entry_items)
+        self._build_default_entries()
+
+        # dialogs are created on first use (and reused after that)
+        self._preferences = None
+        self._about = None
+        self._cluster_dialogs = dict()
 
         self._controller.refresh()
         self.refresh()
-        call_periodically(MENU_UPDATE_INTERVAL, self.refresh)
+        self._refresh_timer_id = call_periodically(MENU_UPDATE_INTERVAL, self.refresh)
+
+    def _build_default_entries(self):
+        """
+        Add the default entries to the menu
+        """
+        entries = []
+        for label, connection in self._default_entry_items:
+            entry = Gtk.MenuItem(label=label)
+            entry.connect("activate", connection)
+            entries.append(entry)
+
+        with self._batch_update():
+            for entry in entries:
+                self.append(entry)
 
     def set_shortcuts(self, shortcuts):
         """
@@ -113,51 +130,95 @@ class K3dvMenu(Gtk.Menu):
         """
         self._shortcuts = shortcuts
 
+    def set_refresh_on_show(self):
+        """
+        Stop refreshing the menu periodically: it will be refreshed when it is about to be shown
+        (and, as usual, soon after we are notified about changes in the clusters).
+        """
+        if self._refresh_timer_id:
+            GLib.source_remove(self._refresh_timer_id)
+            self._refresh_timer_id = 0
+
     def refresh(self, forced=False):
         """
         Refresh the menu, removing old entries and adding the new ones.
         """
         # check if the clusters have changed
-        current_clusters = self._controller.clusters
-        if set(current_clusters.keys()) != set(self._latest_clusters.keys()) or forced:
-            logging.info("[MENU] Clusters have changed: updating menu...")
-            children = self.get_children_map()
-
-            # remove all the entries in the menu
-            for label, child in children.items():
-                if (label in current_clusters.keys()) or (label in self.default_entries):
-                    continue
-                if isinstance(child, Gtk.SeparatorMenuItem) and len(current_clusters) > 0:
+        clusters_signature = self._controller.clusters_signature
+        if not forced and clusters_signature == self._clusters_signature:
+            return True  # must return True for keeping updating
+
+        clusters_names = self._controller.clusters_names
+        logging.info("[MENU] Clusters have changed: updating menu...")
+        children = self.get_children()
+        existing_labels = {child.props.label for child in children}
+        to_remove = existing_labels.difference(clusters_names, self._default_labels, (None,))
+
+        with self._batch_update():
+            # remove the entries for clusters that do not exist anymore
+            for child in children:
+                if isinstance(child, Gtk.SeparatorMenuItem):
+                    if len(clusters_names) == 0:
+                        self.remove(child)
                     continue
 
-                logging.info(f"[MENU] Menu item '{label}' is no longer valid: removing")
-                self.remove(child)
+                label = child.props.label
+                if label in to_remove:
+                    logging.info(f"[MENU] Menu item '{label}' is no longer valid: removing")
+                    self.remove(child)
 
-            if len(current_clusters) > 0:
-                if len(self._latest_clusters) == 0:
+            if len(clusters_names) > 0:
+                if len(self._latest_clusters_names) == 0:
                     separator = Gtk.SeparatorMenuItem()
                     self.append(separator)
 
-                logging.info("[MENU] Showing {} clusters in the menu".format(len(current_clusters)))
-                # show an entry for each existing k3d cluster
-                for cluster in current_clusters.values():
-                    if cluster.name not in children:
-                        cluster_menu_item = Gtk.MenuItem(label=cluster.name)
+                logging.info("[MENU] Showing {} clusters in the menu".format(len(clusters_names)))
+                # show an entry for each new k3d cluster
+                for name in clusters_names:
+                    if name not in existing_labels:
+                        cluster_menu_item = Gtk.MenuItem(label=name)
                         cluster_menu_item.connect("activate",
-                                                  self.on_cluster_clicked, cluster)
-                        logging.info(f"[MENU] Adding menu entry for {cluster.name}")
+                                                  self.on_cluster_clicked, name)
+                        logging.info(f"[MENU] Adding menu entry for {name}")
                         self.append(cluster_menu_item)
 
-            self._latest_clusters = current_clusters
-            self.show_all()
+        self._latest_clusters_names = clusters_names
+        self._clusters_signature = clusters_signature
 
         return True  # must return True for keeping updating
 
-    def get_children_map(self):
+    @contextmanager
+    def _batch_update(self):
+        """
+        Group several changes in the menu, calling `show_all()` only once at the end.
+        """
+        try:
+            yield
+        finally:
+            self.show_all()
+
+    def _get_preferences_dialog(self):
+        """
+        Return the "Preferences" dialog, creating it the first time
+        """
+        if self._preferences is None:
+            self._preferences = PreferencesDialog(docker=self._docker)
+            self._preferences.connect("delete-event", lambda w, e: w.hide_on_delete())
+        return self._preferences
+
+    def _present_cluster_dialog(self, cluster):
         """
-        Return the children (ie, menu items) indexed by labels.
+        Show the dialog for a cluster (or for a new cluster when `cluster` is None),
+        reusing the dialog when it is already open.
         """
-        return {i.props.label: i for i in self.get_children()}
+        key = cluster.name if cluster is not None else None
+        dialog = self._cluster_dialogs.get(key)
+        if dialog is None:
+            dialog = ClusterDialog(self._controller, cluster=cluster)
+            dialog.connect("destroy", lambda *args: self._cluster_dialogs.pop(key, None))
+            self._cluster_dialogs[key] = dialog
+            dialog.show_all()
+        dialog.present()
 
     ##################################################
     # callbacks
@@ -168,8 +229,7 @@ class K3dvMenu(Gtk.Menu):
         Show the "New cluster" dialog
         """
         logging.info("[MENU] Creating new cluster...")
-        new_cluster = ClusterDialog(self._controller)
-        new_cluster.show_all()
+        self._present_cluster_dialog(None)
 
     def on_new_cluster_keystroke(self, *args):
         logging.info(f"[MENU] Creating new cluster (from keystroke): {args}")
@@ -180,8 +240,7 @@ class K3dvMenu(Gtk.Menu):
         # important: cluster_name is unicode: translate to str
         cluster = self._controller.get_cluster_by_name(str(cluster_name))
         if cluster:
-            new_cluster = ClusterDialog(self._controller, cluster=cluster)
-            new_cluster.show_all()
+            self._present_cluster_dialog(cluster)
 
     def on_new_cluster_defaults_clicked(self, *args):
         """
@@ -246,7 +305,9 @@ class K3dvMenu(Gtk.Menu):
         """
         Show the "Preferences" dialog
         """
-        self._preferences.show_all()
+        preferences = self._get_preferences_dialog()
+        preferences.show_all()
+        preferences.present()
 
     def on_shortcuts_clicked(self, *args):
         """
@@ -259,35 +320,74 @@ class K3dvMenu(Gtk.Menu):
         """
         The "About" menu has been clicked.
         """
-        about = AboutDialog(version=self._version)
-        about.show_all()
+        if self._about is None:
+            self._about = AboutDialog(version=self._version)
+        self._about.show_all()
+        self._about.present()
 
     def on_clusters_changed(self, *args):
         """
         Callback invoked when the list of clusters has changed.
         """
-        logging.debug("[MENU] Received signal about changes in clusters: will refresh menu now...")
-        self.refresh(forced=True)
+        if self._refresh_pending_id:
+            return  # a refresh is already scheduled
+
+        def do_refresh():
+            self._refresh_pending_id = 0
+            self.refresh(forced=True)
+            return False  # do not call this again
+
+        logging.debug("[MENU] Received signal about changes in clusters: will refresh menu soon...")
+        self._refresh_pending_id = GLib.timeout_add(MENU_CHANGES_DEBOUNCE_INTERVAL, do_refresh)
+
+    def on_about_to_show(self, *args):
+        """
+        Callback invoked when the menu is about to be shown.
+        """
+
+        def do_refresh():
+            self.refresh()
+            return False  # do not call this again
+
+        GLib.idle_add(do_refresh, priority=GLib.PRIORITY_DEFAULT_IDLE)
 
     def on_active_cluster_changed(self, sender, cluster_name):
         """
         Callback invoked when the active cluster changes
         """
-        if cluster_name is not None:
-            assert running_on_main_thread()
-            assert self._controller.active is not None
-            show_notification(f"{cluster_name} is the new active cluster.", header=f"{cluster_name} ACTIVE")
-        else:
-            show_notification(f"No cluster is currently active.", header=f"No cluster active")
+        # only the latest active cluster will be notified
+        self._active_pending_name = cluster_name
+        if self._active_pending_id:
+            return
+
+        def do_notify():
+            self._active_pending_id = 0
+            name = self._active_pending_name
+            if name == self._last_active_name:
+                return False  # nothing has really changed
+
+            self._last_active_name = name
+            if name is not None:
+                assert running_on_main_thread()
+                show_notification(f"{name} is the new active cluster.", header=f"{name} ACTIVE")
+            else:
+                show_notification(f"No cluster is currently active.", header=f"No cluster active")
+            return False  # do not call this again
+
+        self._active_pending_id = GLib.timeout_add(MENU_CHANGES_DEBOUNCE_INTERVAL, do_notify)
 
     def on_quit_clicked(self, *args):
         """
         We are about to quit...
         """
+        if self._quitting:
+            return
+        self._quitting = True
+
         self._controller.on_quit()
 
         logging.debug("[MENU] Quitting the menu")
-        emit_in_main_thread(self, "quit", 0)
+        self.emit("quit")  # note: menu callbacks are always invoked in the main thread
 
 
 ###############################################################################
@@ -311,6 +411,9 @@ class ShortcutsOverlay(Gtk.ShortcutsWindow):
         self.set_modal(True)
         self.set_skip_taskbar_hint(True)
 
+        # read all the keybindings at once
+        self._kb_map = self._settings.get_all_keybindings()
+
         # self.set_application(application)
         self.add_shortcuts_section(app_shortcuts)
 
@@ -337,7 +440,7 @@ class ShortcutsOverlay(Gtk.ShortcutsWindow):
 
             for title, info in shortcuts.items():
                 shortcut_id, action = info
-                shortcut = self._settings.get_keybinding(shortcut_id)
+                shortcut = self._kb_map.get(shortcut_id, "")
                 short = Gtk.ShortcutsShortcut(title=title, accelerator=shortcut)
                 short.show()
                 group.add(short)
@@ -350,17 +453,23 @@ class ShortcutsOverlay(Gtk.ShortcutsWindow):
 ###############################################################################
 
 class AboutDialog(Gtk.AboutDialog):
+    # the logo, loaded and scaled only once
+    _logo_pixbuf = None
+
     def __init__(self, version):
         Gtk.AboutDialog.__init__(self, modal=True)
         try:
             buttons = list(self.get_action_area())
             close_button = buttons[2]
-            close_button.connect('clicked', lambda _: self.destroy())
+            close_button.connect('clicked', lambda _: self.hide())
             license_button = buttons[1]
             license_button.set_no_show_all(True)
         except IndexError:
             logging.exception("[MENU] GtkAboutDialog layout changed...")
 
+        # keep the dialog around, so it can be shown again
+        self.connect("delete-event", lambda w, e: w.hide_on_delete())
+
         # self.set_transient_for(app_win)
         self.set_modal(True)
         self.set_position(Gtk.WindowPosition.CENTER)
@@ -373,15 +482,22 @@ class AboutDialog(Gtk.AboutDialog):
         self.set_version(version)
         self.set_program_name(APP_TITLE)
 
-        icon_path = ApplicationSettings.get_source_app_icon()
-        if icon_path:
-            logo_pixbuf = GdkPixbuf.Pixbuf.new_from_file(icon_path)
-            self.set_logo(logo_pixbuf.scale_simple(200, 200, GdkPixbuf.InterpType.BILINEAR))
-        else:
-            self.set_logo(None)
+        self.set_logo(self._get_logo())
 
         self.set_authors(APP_MAIN_AUTHORS)
         self.set_documenters(APP_DOCUMENTERS)
         self.set_website(APP_URL)
         self.set_website_label('GitHub')
         self.show_all()
+
+    @classmethod
+    def _get_logo(cls):
+        """
+        Return the (scaled) logo, loading it the first time this is called.
+        """
+        if cls._logo_pixbuf is None:
+            icon_path = ApplicationSettings.get_source_app_icon()
+            if icon_path:
+                logo_pixbuf = GdkPixbuf.Pixbuf.new_from_file(icon_path)
+                cls._logo_pixbuf = logo_pixbuf.scale_simple(200, 200, GdkPixbuf.InterpType.BILINEAR)
+        return cls._logo_pixbuf
@@ -22,18 +22,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
+import json
 import logging
 import os
 import socket
+import stat
+import threading
+from typing import List, Optional
 
-from gi.repository import Granite, Gtk, Gdk
+from gi.repository import Gio, GLib, GObject, Granite, Gtk, Gdk
 
 from .config import (APP_ID,
                      APP_TITLE)
 from .config import ApplicationSettings
 from .config import (DEFAULT_AUTOSTART_ENTRY_FILE,
                      DEFAULT_PREFS_WIDTH,
-                     DEFAULT_PREFS_HEIGHT)
+                     DEFAULT_PREFS_HEIGHT,
+                     DEFAULT_REGISTRY_RESOLVE_TIMEOUT)
 from .config import (SETTINGS_KEY_DOCKER_ENDPOINT,
                      SETTINGS_KEY_DEBUG_LOGS,
                      SETTINGS_KEY_KUBECONFIG,
@@ -46,11 +52,33 @@ from .config import (SETTINGS_KEY_DOCKER_ENDPOINT,
                      SETTINGS_KEY_K3D_IMAGE,
                      SETTINGS_KEY_K3S_ARGS)
 from .docker import is_valid_docker_name, is_valid_docker_host
-from .utils import parse_registry, RegistryInvalidError, set_log_level
+from .utils import call_in_main_thread, parse_registry, RegistryInvalidError, set_log_level
 from .utils_ui import (SettingsPage,
                        show_error_dialog,
                        show_warning_dialog)
 
+# note: most of the tooltips are in the UI definition
+K3D_IMAGE_TOOLTIP = ("When specified, will use an alternative Docker image for the k3d nodes."
+                     "See the list of official k3s images at https://hub.docker.com/r/rancher/k3s/tags")
+
+# attributes needed for checking if a hook is an executable file
+HOOKS_FILE_ATTRIBUTES = f"{Gio.FILE_ATTRIBUTE_STANDARD_TYPE},{Gio.FILE_ATTRIBUTE_ACCESS_CAN_EXECUTE}"
+
+# filters for the hooks file chooser, as (name, mime-type, pattern)
+HOOKS_FILE_FILTERS = (
+    ("Shell", "text/x-shellscript", None),
+    ("Any files", None, "*"),
+)
+
+# number of k3s images added to the list in each iteration of the main loop
+K3S_IMAGES_CHUNK_SIZE = 64
+
+# column types of the lists of images
+_STR_COLS = [GObject.TYPE_STRING]
+
+# the (static) widgets used in the preferences pages
+PREFERENCES_UI_RESOURCE = "/com/github/inercia/k3x/preferences.ui"
+
 SETTINGS_REG_LOCAL = "Regular registry"
 SETTINGS_REG_CACHE = "Only pull-through cache"
 
@@ -80,6 +108,19 @@ class PreferencesWarning(Exception):
         self.message = message
 
 
+###############################################################################
+# Widgets
+###############################################################################
+
+def _build_widgets(*ids: str) -> Gtk.Builder:
+    """
+    Build the given widgets from the preferences UI definition
+    """
+    builder = Gtk.Builder()
+    builder.add_objects_from_resource(PREFERENCES_UI_RESOURCE, list(ids))
+    return builder
+
+
 ###############################################################################
 # Startup entry
 ###############################################################################
@@ -94,7 +135,7 @@ Type=Application
 Categories=System;
 StartupNotify=true
 X-GNOME-Autostart-enabled=true
-"""
+""".encode("utf-8")
 
     def __init__(self):
         super(K3dvStartupEntry, self).__init__()
@@ -102,13 +143,18 @@ X-GNOME-Autostart-enabled=true
 
     def create(self):
         logging.info(f"Creating/over-writting desktop entry file {self._filename}")
-        with open(self._filename, "w") as out:
-            out.write(self.contents)
+        fd = os.open(self._filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.write(fd, self.contents)
+        finally:
+            os.close(fd)
 
     def delete(self):
-        if os.path.exists(self._filename):
-            logging.info(f"Removing desktop entry file {self._filename}")
-            os.remove(self._filename)
+        try:
+            os.unlink(self._filename)
+        except FileNotFoundError:
+            return
+        logging.info(f"Removed desktop entry file {self._filename}")
 
 
 ###############################################################################
@@ -132,35 +178,60 @@ class PreferencesDialog(Gtk.Window):
         self.view = PreferencesPanedView(settings=self._settings, docker=self._docker)
         self.add(self.view)
 
-        self.header = Gtk.HeaderBar()
-        self.header.set_show_close_button(False)
-        self.header.set_title("Preferences")
+        # note: the style classes of the header and the buttons are set in the UI definition
+        builder = _build_widgets("preferences_header")
+        self.header = builder.get_object("preferences_header")
         self.header.get_style_context().remove_class('header-bar')
-        self.header.get_style_context().add_class('titlebar')
-        self.header.get_style_context().add_class('background')
         self.set_titlebar(self.header)
 
-        # add a "Cancel" button
-        cancel_button = Gtk.Button(label="Cancel")
-        cancel_button.connect("clicked", self.on_cancel_clicked)
-        self.header.pack_start(cancel_button)
+        self._cancel_button = builder.get_object("preferences_cancel_button")
+        self._cancel_button.connect("clicked", self.on_cancel_clicked)
+        self._defaults_button = builder.get_object("preferences_defaults_button")
+        self._defaults_button.connect("clicked", self.on_defaults_clicked)
+        self._apply_button = builder.get_object("preferences_apply_button")
+        self._apply_button.connect("clicked", self.on_apply_clicked)
 
-        # add a "Defaults" button
-        defaults_button = Gtk.Button(label="Defaults")
-        defaults_button.connect("clicked", self.on_defaults_clicked)
-        defaults_button.get_style_context().add_class(Gtk.STYLE_CLASS_DESTRUCTIVE_ACTION)
-        self.header.pack_start(defaults_button)
+        # incremented for discarding the result of any prefetch in progress (ie, when the dialog is closed)
+        self._prefetch_generation = 0
+        self.connect("hide", self.on_hide)
 
-        # ... and a "Apply" button
-        apply_button = Gtk.Button(label="Apply")
-        apply_button.connect("clicked", self.on_apply_clicked)
-        apply_button.get_style_context().add_class(Gtk.STYLE_CLASS_SUGGESTED_ACTION)
-        self.header.pack_end(apply_button)
+    def _set_buttons_sensitive(self, sensitive: bool):
+        for button in (self._cancel_button, self._defaults_button, self._apply_button):
+            button.set_sensitive(sensitive)
+
+    def _cancel_prefetch(self):
+        """
+        Discard the result of the prefetch in progress (if any)
+        """
+        self._prefetch_generation += 1
+        self._set_buttons_sensitive(True)
 
     def on_apply_clicked(self, *args):
         """
         The user has pressed the "Apply" button
         """
+        # in delay mode, GSettings already knows if there is something to apply
+        if not self._settings.get_has_unapplied():
+            logging.debug("[PREFERENCES] No changes in preferences: nothing to apply")
+            self.hide()
+            return
+
+        # check the filesystem without blocking the UI, and then validate and apply
+        self._prefetch_generation += 1
+        generation = self._prefetch_generation
+        self._set_buttons_sensitive(False)
+        self.view.on_prefetch(lambda: self.on_prefetch_done(generation))
+
+    def on_prefetch_done(self, generation: int):
+        """
+        The information needed for validating the preferences is available
+        """
+        if generation != self._prefetch_generation or not self.get_visible():
+            logging.debug("[PREFERENCES] Preferences closed or reset while checking them: not applying")
+            return
+
+        self._set_buttons_sensitive(True)
+
         logging.info("Applying changes in preferences")
         try:
             self.view.on_validate()
@@ -186,6 +257,7 @@ class PreferencesDialog(Gtk.Window):
         The user has pressed the "Defaults" button
         """
         logging.info("Resetting to default values")
+        self._cancel_prefetch()
         self.view.set_defaults()
 
     def on_cancel_clicked(self, *args):
@@ -193,9 +265,13 @@ class PreferencesDialog(Gtk.Window):
         The user has pressed the "Cancel" button
         """
         logging.info("Preferences changed canceled: reverting changes")
+        self._cancel_prefetch()
         self._settings.revert()
         self.hide()
 
+    def on_hide(self, *args):
+        self._cancel_prefetch()
+
 
 # Things that could be configurable:
 # TODO: keyboard shortcuts
@@ -223,6 +299,12 @@ class PreferencesPanedView(Gtk.Paned):
         self.k3s_preferences = K3sSettingsPage(settings=self._settings, docker=self._docker)
         self.hooks_preferences = HooksSettingsPage(settings=self._settings, docker=self._docker)
 
+        # note: all the pages validate/apply/reset their settings, even if they have never been shown
+        self._pages = (self.general_preferences,
+                       self.registry_preferences,
+                       self.k3s_preferences,
+                       self.hooks_preferences)
+
         self.stack = Gtk.Stack()
         self.stack.set_halign(Gtk.Align.FILL)
         self.stack.set_valign(Gtk.Align.FILL)
@@ -233,31 +315,61 @@ class PreferencesPanedView(Gtk.Paned):
         self.stack.add_named(self.k3s_preferences, "k3s_page")
         self.stack.add_named(self.hooks_preferences, "hooks_page")
 
-        self.stack.set_transition_type(Gtk.StackTransitionType.CROSSFADE)
-        self.stack.set_transition_duration(100)
+        # switch pages instantly: animating the transition redraws both pages
+        self.stack.set_transition_type(Gtk.StackTransitionType.NONE)
+
+        # build the contents of the pages only when they are shown
+        self._loaded_pages = set()
+        self.stack.connect("notify::visible-child-name", self.on_visible_page_changed)
+        self.on_visible_page_changed(self.stack)
 
         self.settings_sidebar = Granite.SettingsSidebar(stack=self.stack)
 
         self.add(self.settings_sidebar)
         self.add(self.stack)
 
+    def on_visible_page_changed(self, stack, *args):
+        name = stack.get_visible_child_name()
+        if name is None or name in self._loaded_pages:
+            return
+
+        logging.debug(f"[PREFERENCES] Building page {name}")
+        self._loaded_pages.add(name)
+        page = stack.get_visible_child()
+        page.on_build()
+        page.finalize()
+        page.show_all()
+        page.on_load()
+
     def on_validate(self):
-        self.general_preferences.on_validate()
-        self.registry_preferences.on_validate()
-        self.k3s_preferences.on_validate()
-        self.hooks_preferences.on_validate()
+        # only validate the pages that have changed since the last validation
+        for page in self._pages:
+            if page.dirty or page.validate_always:
+                page.on_validate()
+                page.dirty = False
+
+    def on_prefetch(self, callback):
+        # only the pages that will be validated
+        pending = {page for page in self._pages if page.dirty or page.validate_always}
+        if not pending:
+            callback()
+            return
+
+        def on_page_done(page):
+            pending.discard(page)
+            if not pending:
+                callback()
+
+        for page in tuple(pending):
+            page.on_prefetch(lambda p=page: on_page_done(p))
 
     def on_apply(self):
-        self.general_preferences.on_apply()
-        self.registry_preferences.on_apply()
-        self.k3s_preferences.on_apply()
-        self.hooks_preferences.on_apply()
+        for page in self._pages:
+            page.on_apply()
 
     def set_defaults(self):
-        self.general_preferences.set_defaults()
-        self.registry_preferences.set_defaults()
-        self.k3s_preferences.set_defaults()
-        self.hooks_preferences.set_defaults()
+        for page in self._pages:
+            page.set_defaults()
 
 
 ###############################################################################
@@ -265,54 +377,47 @@ class PreferencesPanedView(Gtk.Paned):
 ###############################################################################
 
 class GeneralSettingsPage(SettingsPage):
-    _managed_settings = [
-        SETTINGS_KEY_KUBECONFIG,
-        SETTINGS_KEY_DOCKER_ENDPOINT,
-        SETTINGS_KEY_START_ON_LOGIN,
-    ]
+    _settings_widgets = {
+        SETTINGS_KEY_KUBECONFIG: "kubeconfig_entry",
+        SETTINGS_KEY_DOCKER_ENDPOINT: "docker_endpoint_entry",
+        SETTINGS_KEY_START_ON_LOGIN: "start_login_checkbutton",
+        SETTINGS_KEY_DEBUG_LOGS: "debug_checkbutton",
+    }
+
+    # the "Defaults" button does not change the logs level
+    _unmanaged_settings = frozenset([SETTINGS_KEY_DEBUG_LOGS])
 
-    def __init__(self, **kwargs):
-        self._docker = kwargs.pop("docker", None)
+    def __init__(self, settings: ApplicationSettings, docker):
+        self._docker = docker
 
-        super().__init__(activatable=False,
+        super().__init__(settings=settings,
+                         activatable=False,
                          description="General settings",
                          header="General",
                          icon_name="preferences-desktop",
-                         title="General",
-                         **kwargs)
+                         title="General")
+
+    def on_build(self):
+        builder = _build_widgets("kubeconfig_label", "kubeconfig_entry",
+                                 "docker_endpoint_label", "docker_endpoint_entry",
+                                 "start_login_label", "start_login_checkbutton",
+                                 "debug_label", "debug_checkbutton")
 
         # The Kubeconfig
-        self.kubeconfig_entry = Gtk.Entry()
-        self.kubeconfig_entry.props.hexpand = False
-        self.kubeconfig_entry.props.halign = Gtk.Align.START
-        self.kubeconfig_entry.set_tooltip_text(
-            "The KUBECONFIG file. You should use something like "
-            "~/.kube/config for having it automatically loaded by kubectl. "
-            "It is important to note that this file WILL BE OVERWRITTEN. "
-            "You should choose a different file if you are using some cloud providers "
-            "or cluster created with some other tools.")
-        self.append_labeled_entry("Kubeconfig file:", self.kubeconfig_entry, SETTINGS_KEY_KUBECONFIG)
+        self.kubeconfig_entry = builder.get_object("kubeconfig_entry")
+        self.append_labeled_entry(builder.get_object("kubeconfig_label"), self.kubeconfig_entry)
 
         # The docker entrypoint
-        self.docker_endpoint_entry = Gtk.Entry()
-        self.docker_endpoint_entry.props.hexpand = False
-        self.docker_endpoint_entry.set_tooltip_text(
-            "Docker endpoint, like unix:///var/run/docker.sock or "
-            "tcp:192.168.1.10:1111")
-        self.append_labeled_entry("Docker URL:", self.docker_endpoint_entry, SETTINGS_KEY_DOCKER_ENDPOINT)
+        self.docker_endpoint_entry = builder.get_object("docker_endpoint_entry")
+        self.append_labeled_entry(builder.get_object("docker_endpoint_label"), self.docker_endpoint_entry)
 
         # Start on login
-        self.start_login_checkbutton = Gtk.Switch()
-        self.start_login_checkbutton.set_tooltip_text(
-            f"When enabled, {APP_TITLE} is started on login")
-        self.append_labeled_entry("Start on login:", self.start_login_checkbutton, SETTINGS_KEY_START_ON_LOGIN)
+        self.start_login_checkbutton = builder.get_object("start_login_checkbutton")
+        self.append_labeled_entry(builder.get_object("start_login_label"), self.start_login_checkbutton)
 
         # Debug logs
-        self.debug_checkbutton = Gtk.Switch()
-        self.debug_checkbutton.set_tooltip_text(
-            "When enabled, debug logs will be recorded in the journal "
-            "(you can view them with `journalctl` from a terminal")
-        self.append_labeled_entry("Debug-level logs:", self.debug_checkbutton, SETTINGS_KEY_DEBUG_LOGS)
+        self.debug_checkbutton = builder.get_object("debug_checkbutton")
+        self.append_labeled_entry(builder.get_object("debug_label"), self.debug_checkbutton)
 
     def on_apply(self):
         start_on_login = self._settings.get_boolean(SETTINGS_KEY_START_ON_LOGIN)
@@ -339,47 +444,93 @@ class GeneralSettingsPage(SettingsPage):
 # Advanced settings: common settings for the registry
 ###############################################################################
 
+def _can_resolve(name: str) -> bool:
+    """
+    Return True if the given name can be resolved
+    """
+    try:
+        # note: IPv6 addresses come with brackets, like "[::1]"
+        socket.getaddrinfo(name.strip("[]"), None, 0, socket.SOCK_STREAM)
+        return True
+    except (OSError, UnicodeError):
+        return False
+
+
 class RegistrySettingsPage(SettingsPage):
-    _managed_settings = [
-        SETTINGS_KEY_REG_MODE,
-        SETTINGS_KEY_REG_ADDRESS,
-        SETTINGS_KEY_REG_VOL,
-    ]
+    _settings_widgets = {
+        SETTINGS_KEY_REG_MODE: "registry_mode",
+        SETTINGS_KEY_REG_ADDRESS: "registry_name_entry",
+        SETTINGS_KEY_REG_VOL: "registry_volume_entry",
+    }
 
-    def __init__(self, **kwargs):
-        self._docker = kwargs.pop("docker", None)
+    def __init__(self, settings: ApplicationSettings, docker):
+        self._docker = docker
 
-        super().__init__(activatable=False,
+        super().__init__(settings=settings,
+                         activatable=False,
                          description="Local registry",
                          header="Advanced settings",
                          icon_name="folder-remote",
-                         title="Registry",
-                         **kwargs)
+                         title="Registry")
 
-        registry_mode = Gtk.ListStore(str)
-        registry_mode.append([SETTINGS_REG_LOCAL])
-        registry_mode.append([SETTINGS_REG_CACHE])
+        # results of the resolution of registry names, obtained in `on_prefetch()`
+        self._resolved = {}
 
-        self.registry_mode = Gtk.ComboBox.new_with_model(registry_mode)
-        renderer_text = Gtk.CellRendererText()
-        self.registry_mode.pack_start(renderer_text, True)
-        self.registry_mode.add_attribute(renderer_text, "text", 0)
-        self.registry_mode.set_tooltip_text(
-            "When configured as a pull-through cache, the local Docker registry will act "
-            "as a local cache of all the images that are downloaded "
-            "from the Docker Hub, but you cannot 'push' to this registry. ")
-        self.append_labeled_entry("Local registry mode:", self.registry_mode, SETTINGS_KEY_REG_MODE)
+    def on_build(self):
+        builder = _build_widgets("registry_mode_label", "registry_mode",
+                                 "registry_name_label", "registry_name_entry",
+                                 "registry_volume_label", "registry_volume_entry")
+
+        self.registry_mode = builder.get_object("registry_mode")
+        for mode in (SETTINGS_REG_LOCAL, SETTINGS_REG_CACHE):
+            self.registry_mode.append_text(mode)
+        self.append_labeled_entry(builder.get_object("registry_mode_label"), self.registry_mode)
 
         # Registry hostname
-        self.registry_name_entry = Gtk.Entry()
-        self.registry_name_entry.hexpand = True
-        self.append_labeled_entry("Registry Name/Port:", self.registry_name_entry, SETTINGS_KEY_REG_ADDRESS)
+        self.registry_name_entry = builder.get_object("registry_name_entry")
+        self.append_labeled_entry(builder.get_object("registry_name_label"), self.registry_name_entry)
 
         # Registry volume
-        self.registry_volume_entry = Gtk.Entry()
-        self.registry_volume_entry.hexpand = True
-        self.registry_volume_entry.set_tooltip_text("Volume for saving the images.")
-        self.append_labeled_entry("Volume for images:", self.registry_volume_entry, SETTINGS_KEY_REG_VOL)
+        self.registry_volume_entry = builder.get_object("registry_volume_entry")
+        self.append_labeled_entry(builder.get_object("registry_volume_label"), self.registry_volume_entry)
+
+    def on_prefetch(self, callback):
+        """
+        Resolve the registry name in a different thread, giving up after some time
+        """
+        try:
+            parsed_registry = parse_registry(self._settings.get_safe_string(SETTINGS_KEY_REG_ADDRESS))
+        except RegistryInvalidError:
+            parsed_registry = None
+
+        if parsed_registry is None:
+            callback()
+            return
+
+        registry_name, _ = parsed_registry
+        done = []
+
+        def finish(resolved):
+            if done:
+                return
+            done.append(True)
+            self._resolved[registry_name] = resolved
+            callback()
+
+        def resolve():
+            call_in_main_thread(finish, _can_resolve(registry_name))
+
+        logging.debug(f"[PREFERENCES] Resolving {registry_name}...")
+        thread = threading.Thread(target=resolve)
+        thread.daemon = True
+        thread.start()
+
+        def on_timeout():
+            if not done:
+                logging.warning(f"[PREFERENCES] Timeout when resolving {registry_name}")
+            finish(False)
+
+        GLib.timeout_add(DEFAULT_REGISTRY_RESOLVE_TIMEOUT, on_timeout)
 
     def on_validate(self):
         """
@@ -409,9 +560,10 @@ class RegistrySettingsPage(SettingsPage):
                                        f"'{registry_volume}' is not a valid Docker volume name.")
 
         logging.debug("[PREFERENCES] Validating the registry address can be resolved...")
-        try:
-            socket.gethostbyname_ex(registry_name)
-        except Exception as e:
+        resolved = self._resolved.pop(registry_name, None)
+        if resolved is None:
+            resolved = _can_resolve(registry_name)
+        if not resolved:
             raise PreferencesError(SETTINGS_KEY_REG_ADDRESS,
                                    f"DNS name '<b><tt>{registry_name}</tt></b>' cannot be resolved."
                                    "\n\n"
@@ -426,48 +578,113 @@ class RegistrySettingsPage(SettingsPage):
 # Advanced: K3s settings
 ###############################################################################
 
+def _k3s_images_cache_file(docker) -> str:
+    """
+    Return the file where the k3s images are cached for the current Docker endpoint
+    """
+    endpoint_hash = hashlib.sha1(docker.docker_host.encode()).hexdigest()[:12]
+    return os.path.join(ApplicationSettings.get_cache_dir(), APP_TITLE, f"k3s_images-{endpoint_hash}.json")
+
+
+def _load_cached_k3s_images(docker) -> List[str]:
+    """
+    Return the names of the official k3s images in the cache in disk (if any)
+    """
+    cache_file = _k3s_images_cache_file(docker)
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _fetch_k3s_images(docker) -> List[str]:
+    """
+    Return the names of the official k3s images available in Docker, saving them in the cache
+    """
+    # note: ignore images without tags
+    images = docker.get_official_k3s_images()
+    names = [image.attrs["RepoTags"][0] for image in images if image.attrs.get("RepoTags")]
+    logging.debug("... images: %s", names)
+
+    if docker.valid:
+        cache_file = _k3s_images_cache_file(docker)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, "w") as f:
+                json.dump(names, f)
+        except OSError as e:
+            logging.warning(f"Could not save the list of k3s images in {cache_file}: {e}")
+
+    return names
+
+
 class K3sSettingsPage(SettingsPage):
-    _managed_settings = [
-        SETTINGS_KEY_K3D_IMAGE,
-        SETTINGS_KEY_K3S_ARGS,
-    ]
+    _settings_widgets = {
+        SETTINGS_KEY_K3D_IMAGE: "k3d_image",
+        SETTINGS_KEY_K3S_ARGS: "k3s_args",
+    }
 
-    def __init__(self, **kwargs):
-        self._docker = kwargs.pop("docker", None)
+    def __init__(self, settings: ApplicationSettings, docker):
+        self._docker = docker
 
-        super().__init__(activatable=False,
+        super().__init__(settings=settings,
+                         activatable=False,
                          description="k3s server settings",
                          icon_name="preferences-system",
-                         title="K3s",
-                         **kwargs)
+                         title="K3s")
 
-        images_store = Gtk.ListStore(str)
-        logging.debug(f"Adding k3d images in the Docker Hub")
-        images_store.append([""])  # empty Docker image
-        for image in self._docker.get_official_k3s_images():
-            try:
-                name = image.attrs["RepoTags"][0]
-                logging.debug(f"... image {name}")
-            except Exception as e:
-                logging.debug(f"Could not grab information for image {image}: {e}")
-            else:
-                images_store.append([name])  # use `name` for id and... name
+    def on_build(self):
+        builder = _build_widgets("k3d_image_label",
+                                 "k3s_args_label", "k3s_args")
+
+        # note: the list of images is filled in `on_load()`
+        self._images_store = Gtk.ListStore.new(_STR_COLS)
+        self._images_store.append([""])  # empty Docker image
 
-        self.k3d_image = Gtk.ComboBox.new_with_model_and_entry(images_store)
+        self.k3d_image = Gtk.ComboBox.new_with_model_and_entry(self._images_store)
         renderer_text = Gtk.CellRendererText()
         self.k3d_image.pack_start(renderer_text, True)
         self.k3d_image.add_attribute(renderer_text, "text", 0)
         self.k3d_image.hexpand = True
-        self.k3d_image.set_tooltip_text(
-            "When specified, will use an alternative Docker image for the k3d nodes."
-            "See the list of official k3s images at https://hub.docker.com/r/rancher/k3s/tags")
-        self.append_labeled_entry("k3d docker image:", self.k3d_image, SETTINGS_KEY_K3D_IMAGE)
-
-        self.k3s_args = Gtk.Entry()
-        self.k3s_args.hexpand = True
-        self.k3s_args.set_tooltip_text(
-            "When specified, will add these extra arguments to the k3s server.")
-        self.append_labeled_entry("k3s server args:", self.k3s_args, SETTINGS_KEY_K3S_ARGS)
+        self.k3d_image.set_tooltip_text(K3D_IMAGE_TOOLTIP)
+        self.append_labeled_entry(builder.get_object("k3d_image_label"), self.k3d_image)
+
+        self.k3s_args = builder.get_object("k3s_args")
+        self.append_labeled_entry(builder.get_object("k3s_args_label"), self.k3s_args)
+
+    def on_load(self):
+        def add_images(names, generation):
+            if generation != self._images_generation:
+                return GLib.SOURCE_REMOVE  # the list has been replaced in the meantime
+
+            chunk = names[:K3S_IMAGES_CHUNK_SIZE]
+            del names[:K3S_IMAGES_CHUNK_SIZE]
+            for name in chunk:
+                self._images_store.insert_with_valuesv(-1, [0], [name])  # use `name` for id and... name
+            return GLib.SOURCE_CONTINUE if names else GLib.SOURCE_REMOVE
+
+        def replace_images(names):
+            self._images_generation += 1
+            self._images_store.clear()
+            self._images_store.append([""])  # empty Docker image
+            GLib.idle_add(add_images, names, self._images_generation)
+
+        def get_images():
+            names = _load_cached_k3s_images(self._docker)
+            if names:
+                call_in_main_thread(replace_images, list(names))
+
+            logging.debug(f"Refreshing k3d images available in Docker")
+            new_names = _fetch_k3s_images(self._docker)
+            if new_names and new_names != names:
+                call_in_main_thread(replace_images, new_names)
+
+        # show the cached images (if any) and always refresh them in the background
+        self._images_generation = 0
+        thread = threading.Thread(target=get_images)
+        thread.daemon = True
+        thread.start()
 
 
 ###############################################################################
@@ -475,51 +692,41 @@ class K3sSettingsPage(SettingsPage):
 ###############################################################################
 
 class HooksSettingsPage(SettingsPage):
-    _managed_settings = [
-        SETTINGS_KEY_CREATE_HOOK,
-        SETTINGS_KEY_DESTROY_HOOK,
-    ]
+    _settings_widgets = {
+        SETTINGS_KEY_CREATE_HOOK: "cluster_create_hook",
+        SETTINGS_KEY_DESTROY_HOOK: "cluster_destroy_hook",
+    }
 
-    def __init__(self, **kwargs):
-        self._docker = kwargs.pop("docker", None)
+    # the scripts could be removed or chmod'ed at any moment
+    validate_always = True
 
-        super().__init__(activatable=False,
+    def __init__(self, settings: ApplicationSettings, docker):
+        self._docker = docker
+
+        super().__init__(settings=settings,
+                         activatable=False,
                          description="Scripts to run at some moments",
                          icon_name="folder",
-                         title="Scripts",
-                         **kwargs)
-
-        self.cluster_create_hook = Gtk.Entry()
-        self.cluster_create_hook.props.hexpand = False
-        self.cluster_create_hook.set_tooltip_text(
-            "A script that will be run right after creating a new cluster")
-        self.cluster_create_hook.set_icon_from_icon_name(Gtk.EntryIconPosition.SECONDARY, "folder-open")
-        self.append_labeled_entry("After-creation script:", self.cluster_create_hook, SETTINGS_KEY_CREATE_HOOK)
-
-        self.cluster_destroy_hook = Gtk.Entry()
-        self.cluster_destroy_hook.props.hexpand = False
-        self.cluster_destroy_hook.set_tooltip_text(
-            "A script that will be run right after deleting a cluster")
-        self.cluster_destroy_hook.set_icon_from_icon_name(Gtk.EntryIconPosition.SECONDARY, "folder-open")
-        self.append_labeled_entry("After-destruction script:", self.cluster_destroy_hook, SETTINGS_KEY_DESTROY_HOOK)
+                         title="Scripts")
 
-        def select_file(entry, icon_pos, event, *args):
-            dialog = Gtk.FileChooserDialog("Please choose a script",
-                                           self.get_toplevel(),
-                                           Gtk.FileChooserAction.OPEN,
-                                           (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
-                                            Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
+        # the file chooser is shared by all the hooks, and created on first use
+        self._hook_chooser = None
+
+        # (path -> what is wrong with that script, or None), as found when preparing the last "Apply"
+        self._path_problems = {}
 
-            filter_text = Gtk.FileFilter()
-            filter_text.set_name("Shell")
-            filter_text.add_mime_type("text/x-shellscript")
-            dialog.add_filter(filter_text)
+    def on_build(self):
+        builder = _build_widgets("cluster_create_hook_label", "cluster_create_hook",
+                                 "cluster_destroy_hook_label", "cluster_destroy_hook")
 
-            filter_any = Gtk.FileFilter()
-            filter_any.set_name("Any files")
-            filter_any.add_pattern("*")
-            dialog.add_filter(filter_any)
+        self.cluster_create_hook = builder.get_object("cluster_create_hook")
+        self.append_labeled_entry(builder.get_object("cluster_create_hook_label"), self.cluster_create_hook)
 
+        self.cluster_destroy_hook = builder.get_object("cluster_destroy_hook")
+        self.append_labeled_entry(builder.get_object("cluster_destroy_hook_label"), self.cluster_destroy_hook)
+
+        def select_file(entry, icon_pos, event, *args):
+            dialog = self._get_hook_chooser()
             response = dialog.run()
             if response == Gtk.ResponseType.OK:
                 filename = dialog.get_filename()
@@ -531,32 +738,112 @@ class HooksSettingsPage(SettingsPage):
             elif response == Gtk.ResponseType.CANCEL:
                 logging.debug("No hook selected")
 
-            dialog.destroy()
+            dialog.hide()
 
         self.cluster_create_hook.connect("icon-press", select_file)
         self.cluster_destroy_hook.connect("icon-press", select_file)
 
+    def _get_hook_chooser(self) -> Gtk.FileChooserDialog:
+        """
+        Return the file chooser for the hooks, creating it the first time
+        """
+        if self._hook_chooser is None:
+            dialog = Gtk.FileChooserDialog("Please choose a script",
+                                           self.get_toplevel(),
+                                           Gtk.FileChooserAction.OPEN,
+                                           (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+                                            Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
+
+            for name, mime_type, pattern in HOOKS_FILE_FILTERS:
+                file_filter = Gtk.FileFilter()
+                file_filter.set_name(name)
+                if mime_type:
+                    file_filter.add_mime_type(mime_type)
+                if pattern:
+                    file_filter.add_pattern(pattern)
+                dialog.add_filter(file_filter)
+
+            dialog.connect("delete-event", lambda w, e: w.hide_on_delete())
+            self._hook_chooser = dialog
+
+        return self._hook_chooser
+
+    def on_prefetch(self, callback):
+        """
+        Check asynchronously if the hooks exist and are executable, invoking `callback` when we know it
+        """
+        hooks = (self._settings.get_safe_string(SETTINGS_KEY_CREATE_HOOK),
+                 self._settings.get_safe_string(SETTINGS_KEY_DESTROY_HOOK))
+
+        # check the scripts again on every "Apply": they could have been removed or chmod'ed since the last one
+        problems = self._path_problems = {}
+        pending = {path for path in hooks if path}
+        if not pending:
+            callback()
+            return
+
+        def on_queried(f, res, path):
+            try:
+                info = f.query_info_finish(res)
+                if info.get_file_type() == Gio.FileType.REGULAR and \
+                        info.get_attribute_boolean(Gio.FILE_ATTRIBUTE_ACCESS_CAN_EXECUTE):
+                    problems[path] = None
+                else:
+                    problems[path] = "is not an executable file."
+            except GLib.Error:
+                problems[path] = "does not exist or is not accessible."
+
+            pending.discard(path)
+            if not pending:
+                callback()
+
+        for path in tuple(pending):
+            logging.debug(f"[PREFERENCES] Checking if {path} exists...")
+            Gio.File.new_for_path(path).query_info_async(HOOKS_FILE_ATTRIBUTES,
+                                                         Gio.FileQueryInfoFlags.NONE,
+                                                         GLib.PRIORITY_DEFAULT,
+                                                         None,
+                                                         on_queried,
+                                                         path)
+
+    def _path_problem(self, path: str) -> Optional[str]:
+        """
+        Return what is wrong with a script (or None when it is fine)
+        """
+        if path not in self._path_problems:
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._path_problems[path] = "does not exist or is not accessible."
+            else:
+                executable = stat.S_ISREG(st.st_mode) and os.access(path, os.X_OK)
+                self._path_problems[path] = None if executable else "is not an executable file."
+        return self._path_problems[path]
+
     def on_validate(self):
         """
         Validate all the settings, raising an exception if something is wrong
         """
-        logging.debug("[PREFERENCES] Validating hooks...")
         create_hook = self._settings.get_safe_string(SETTINGS_KEY_CREATE_HOOK)
+        destroy_hook = self._settings.get_safe_string(SETTINGS_KEY_DESTROY_HOOK)
+
+        logging.debug("[PREFERENCES] Validating hooks...")
         if len(create_hook) > 0:
-            if not os.path.exists(create_hook):
-                raise PreferencesError("cluster_create_hook",
+            problem = self._path_problem(create_hook)
+            if problem is not None:
+                raise PreferencesError(SETTINGS_KEY_CREATE_HOOK,
                                        f"The create script:"
                                        "\n\n"
                                        f"<b><tt>{create_hook}</tt></b>"
                                        "\n\n"
-                                       "does not exist or is not accessible.")
+                                       f"{problem}")
 
-        destroy_hook = self._settings.get_safe_string(SETTINGS_KEY_DESTROY_HOOK)
         if len(destroy_hook) > 0:
-            if not os.path.exists(destroy_hook):
-                raise PreferencesError("cluster_destroy_hook",
+            problem = self._path_problem(destroy_hook)
+            if problem is not None:
+                raise PreferencesError(SETTINGS_KEY_DESTROY_HOOK,
                                        f"The destruction script:"
                                        "\n\n"
-                                       f"<b><tt>{destroy_hook}</tt><b>"
+                                       f"<b><tt>{destroy_hook}</tt></b>"
                                        "\n\n"
-                                       "does not exist or is not accessible.")
+                                       f"{problem}")
@@ -23,12 +23,20 @@
 # SOFTWARE.
 
 
+import collections
+import errno
+import functools
 import logging
 import os
 import random
+import re
+import shutil
+import signal
+import socket
 import subprocess
 import threading
-from typing import Iterator, Callable, Optional, Tuple, List, Dict
+import time
+from typing import Iterator, Callable, Optional, Tuple, List, Dict, FrozenSet
 
 from gi.repository import GLib, GObject
 
@@ -64,6 +72,26 @@ class IPDeviceError(Exception):
 # subprocesses
 ###############################################################################
 
+# size of the reads from the output of the commands we run
+RUN_COMMAND_READ_SIZE = 64 * 1024
+
+# max amount of (the last) error output of the commands we run that we keep
+RUN_COMMAND_STDERR_LIMIT = 64 * 1024
+
+
+def _drain_stderr(stream, buf: bytearray) -> None:
+    """
+    Read a stream until EOF, keeping only the last RUN_COMMAND_STDERR_LIMIT bytes in `buf`
+    """
+    fd = stream.fileno()
+    while True:
+        chunk = os.read(fd, RUN_COMMAND_READ_SIZE)
+        if not chunk:
+            break
+        buf.extend(chunk)
+        if len(buf) > RUN_COMMAND_STDERR_LIMIT:
+            del buf[:len(buf) - RUN_COMMAND_STDERR_LIMIT]
+
 
 def run_command_stdout(*args, **kwargs) -> Iterator[str]:
     stdout = kwargs.pop("stdout", subprocess.PIPE)
@@ -72,18 +100,42 @@ def run_command_stdout(*args, **kwargs) -> Iterator[str]:
     if stdout != subprocess.PIPE:
         logging.debug(f"[UTILS] Running process while redirecting output to {stdout.name}")
 
-    p = subprocess.Popen(args, stdout=stdout, stderr=stderr, universal_newlines=True, **kwargs)
+    # note: unbuffered pipes, as we read directly from their file descriptors
+    p = subprocess.Popen(args, stdout=stdout, stderr=stderr, bufsize=0, **kwargs)
+
+    # drain stderr while we read stdout: the process would block if the stderr pipe got full
+    stderr_buf = bytearray()
+    stderr_reader = None
+    if stderr == subprocess.PIPE:
+        stderr_reader = threading.Thread(target=_drain_stderr, args=(p.stderr, stderr_buf))
+        stderr_reader.daemon = True
+        stderr_reader.start()
 
     if stdout == subprocess.PIPE:
-        for stdout in iter(p.stdout.readline, ""):
-            yield stdout.strip()
-        # p.stdout.close()
-        # p.stderr.close()
+        # read big chunks and split them in lines, decoding each chunk only once
+        pending = b""
+        stdout_fd = p.stdout.fileno()
+        while True:
+            chunk = os.read(stdout_fd, RUN_COMMAND_READ_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk
+            end = data.rfind(b"\n")
+            if end < 0:
+                pending = data
+                continue
+            pending = data[end + 1:]
+            for line in data[:end].decode("utf-8", "replace").split("\n"):
+                yield line.strip()
+        if pending:
+            yield pending.decode("utf-8", "replace").strip()
 
     return_code = p.wait()
+    if stderr_reader is not None:
+        stderr_reader.join(timeout=1.0)
     if return_code:
         raise subprocess.CalledProcessError(returncode=return_code, cmd=args,
-                                            output="\n".join(p.stderr.readlines()))
+                                            output=stderr_buf.decode("utf-8", "replace"))
 
 
 def run_hook_script(script: str, env: Dict[str, str]) -> None:
@@ -95,30 +147,43 @@ def run_hook_script(script: str, env: Dict[str, str]) -> None:
     hook_env = os.environ.copy()
     hook_env.update(env)
 
-    logging.info(f"[UTILS] Running script '{script}' (env: {hook_env})")
+    logging.info(f"[UTILS] Running script '{script}' (extra env: {env})")
 
     if not os.access(script, os.X_OK):
         raise ScriptError(f"{script} is not executable")
 
+    # run the script in its own session, so we can kill everything it starts
     try:
-        result = subprocess.run([script],
-                                shell=True,
-                                capture_output=False,
-                                timeout=DEFAULT_SCRIPTS_TIMEOUT,
-                                check=True,
-                                env=hook_env)
-    except subprocess.CalledProcessError as e:
-        raise ScriptError(e)
-    except subprocess.TimeoutExpired as e:
-        raise ScriptError(f"timeout {DEFAULT_SCRIPTS_TIMEOUT} expired when running {script}")
+        try:
+            p = subprocess.Popen([script], start_new_session=True, env=hook_env)
+        except OSError as e:
+            if e.errno != errno.ENOEXEC:
+                raise
+            # no shebang: run it with the shell, like the shell would do
+            p = subprocess.Popen(["/bin/sh", script], start_new_session=True, env=hook_env)
     except Exception as e:
         logging.warning(f"Error when running script {script}: {e}")
         raise ScriptError(e)
 
+    try:
+        return_code = p.wait(timeout=DEFAULT_SCRIPTS_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        p.wait()
+        raise ScriptError(f"timeout {DEFAULT_SCRIPTS_TIMEOUT} expired when running {script}")
+
+    if return_code:
+        raise ScriptError(subprocess.CalledProcessError(returncode=return_code, cmd=[script]))
+
+
+_main_thread_ident = threading.main_thread().ident
+
 
 def running_on_main_thread() -> bool:
-    thread_name = threading.currentThread().name
-    return thread_name == "MainThread"
+    return threading.get_ident() == _main_thread_ident
 
 
 ###############################################################################
@@ -129,7 +194,6 @@ def get_iface_ip(ifname):
     """
     Get the IOP address for an interface
     """
-    import socket
     import fcntl
     import struct
 
@@ -146,9 +210,61 @@ def is_port_in_use(port: int) -> bool:
     """
     Check if a porty is in use.
     """
-    import socket
+    # try to bind the port instead of connecting to it: this does not send anything
+    # and it also detects ports that are bound but not listening
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        return s.connect_ex(('localhost', port)) == 0
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind(('', port))
+            return False
+        except OSError:
+            return True
+
+
+@functools.lru_cache(maxsize=1)
+def _ephemeral_port_range() -> Optional[Tuple[int, int]]:
+    """
+    Return the range of ports the kernel uses for ephemeral ports, as [start, end)
+    """
+    try:
+        with open("/proc/sys/net/ipv4/ip_local_port_range") as f:
+            low, high = f.read().split()
+        return int(low), int(high) + 1
+    except (OSError, ValueError):
+        return None
+
+
+# how long the list of listening ports is reused (in seconds)
+LISTENING_PORTS_TTL = 0.2
+
+_listening_ports_cache: Tuple[float, FrozenSet[int]] = (0.0, frozenset())
+
+
+def _listening_ports() -> FrozenSet[int]:
+    """
+    Return the TCP ports in LISTEN state, as reported by the kernel (or an empty set if not available)
+    """
+    global _listening_ports_cache
+
+    timestamp, ports = _listening_ports_cache
+    now = time.monotonic()
+    if now - timestamp < LISTENING_PORTS_TTL:
+        return ports
+
+    listening = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                next(f, None)  # skip the header
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 3 and fields[3] == "0A":  # LISTEN
+                        listening.add(int(fields[1].rpartition(":")[2], 16))
+        except (OSError, ValueError):
+            continue
+
+    _listening_ports_cache = (now, frozenset(listening))
+    return _listening_ports_cache[1]
 
 
 def find_unused_port_in_range(start: int, end: int) -> Optional[int]:
@@ -158,11 +274,28 @@ def find_unused_port_in_range(start: int, end: int) -> Optional[int]:
     rang = end - start
     assert (rang > 0)
 
-    # try random ports (for up to `rang` times)
-    for _ in range(0, rang):
-        maybe_port = start + random.randrange(0, rang)
-        if not is_port_in_use(maybe_port):
-            return maybe_port
+    # when the range overlaps with the ephemeral ports, try to let the kernel choose a free port
+    ephemeral = _ephemeral_port_range()
+    if ephemeral is not None and ephemeral[0] < end and start < ephemeral[1]:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(('', 0))
+            port = s.getsockname()[1]
+        if start <= port < end:
+            return port
+
+    # try to bind all the ports in the range, in random order, skipping the ones we know are listening
+    # note: a socket can try to bind another port after a failed bind(), so we need only one
+    listening = _listening_ports()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        for maybe_port in random.sample(range(start, end), rang):
+            if maybe_port in listening:
+                continue
+            try:
+                s.bind(('', maybe_port))
+                return maybe_port
+            except OSError:
+                continue
     return None
 
 
@@ -197,6 +330,47 @@ def parse_or_get_address(in_address: Optional[str], start: int, end: int) -> str
 # OS utils
 ###############################################################################
 
+# index of (directory -> names of the entries in that directory)
+# (the modification time of the directory is kept for knowing when it must be scanned again)
+_path_index: Dict[str, Tuple[Optional[float], FrozenSet[str]]] = {}
+
+
+def _dir_entries(path: str, rescan: bool = False) -> FrozenSet[str]:
+    """
+    Return the names of the entries in a directory, scanning it only the first time.
+    With `rescan`, the directory is scanned again only if it has been modified since then.
+    """
+    indexed = _path_index.get(path)
+    if indexed is not None and not rescan:
+        return indexed[1]
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+
+    if indexed is None or mtime != indexed[0]:
+        entries = frozenset()
+        if mtime is not None:
+            try:
+                with os.scandir(path) as it:
+                    entries = frozenset(entry.name for entry in it)
+            except OSError:
+                pass
+        indexed = (mtime, entries)
+        _path_index[path] = indexed
+
+    return indexed[1]
+
+
+@functools.lru_cache(maxsize=4)
+def _split_path(path: str) -> Tuple[str, ...]:
+    """
+    Split a PATH-like string (cached, so it is only split again when the PATH changes)
+    """
+    return tuple(path.split(os.pathsep))
+
+
 def find_executable(executable: str, extra_paths: Optional[List[str]] = None) -> Optional[str]:
     """
     Find the path fo4r the executable provided, or None if it cannot be found.
@@ -204,58 +378,106 @@ def find_executable(executable: str, extra_paths: Optional[List[str]] = None) ->
     if extra_paths is None:
         extra_paths = []
 
-    paths = os.environ['PATH'].split(":")
-    paths += extra_paths
+    paths = _split_path(os.environ.get("PATH", os.defpath)) + tuple(extra_paths)
 
-    for path in paths:
-        execname = os.path.join(path, executable)
-        if os.path.isfile(execname):
-            return execname
+    # look in the index first, and scan the directories again when not found there
+    # (something could have been installed after we indexed the directory)
+    for rescan in (False, True):
+        for path in paths:
+            if executable in _dir_entries(path, rescan=rescan):
+                execname = shutil.which(executable, path=path)
+                if execname is not None:
+                    return execname
 
     return None
 
 
-def call_periodically(period: int, function: Callable) -> None:
+def call_periodically(period: int, function: Callable) -> int:
     """
-    Call some function periodically
+    Call some function periodically (`period` in milliseconds), returning the ID of the event source
     """
-    GLib.timeout_add(period, function)
+    # whole seconds can use `timeout_add_seconds`, that can be grouped with other timers for saving power
+    if period % 1000 == 0:
+        return GLib.timeout_add_seconds(period // 1000, function)
+    return GLib.timeout_add(period, function)
+
+
+# max number of pending calls run in each iteration of the main loop
+MAIN_THREAD_CALLS_BATCH = 64
+
+# calls waiting to be run in the main thread, and if there is an idle source for running them
+_main_thread_calls = collections.deque()
+_main_thread_calls_lock = threading.Lock()
+_main_thread_calls_scheduled = False
+
+
+def _run_main_thread_calls() -> bool:
+    global _main_thread_calls_scheduled
+
+    for _ in range(MAIN_THREAD_CALLS_BATCH):
+        try:
+            c, args = _main_thread_calls.popleft()
+        except IndexError:
+            break
+        try:
+            c(*args)
+        except Exception as e:
+            logging.exception(f"[UTILS] Error when running {c} in the main thread: {e}")
+
+    with _main_thread_calls_lock:
+        if _main_thread_calls:
+            return GLib.SOURCE_CONTINUE
+        _main_thread_calls_scheduled = False
+        return GLib.SOURCE_REMOVE
 
 
 def call_in_main_thread(c: Callable, *args) -> None:
     """
-    Important: do not return any value in `c` or it will be called again... and again... and again...
+    Call `c` in the main thread. Calls are queued and run in batches by a single idle handler.
+    The value returned by `c` is ignored.
     """
-    GObject.idle_add(c, *args)
+    global _main_thread_calls_scheduled
+
+    with _main_thread_calls_lock:
+        _main_thread_calls.append((c, args))
+        if _main_thread_calls_scheduled:
+            return
+        _main_thread_calls_scheduled = True
+
+    GLib.idle_add(_run_main_thread_calls, priority=GLib.PRIORITY_DEFAULT_IDLE)
 
 
 def truncate_file(f: str) -> None:
-    d = os.path.dirname(f)
-    os.makedirs(d, exist_ok=True)
-    with open(f, "w") as fp:
-        fp.truncate(0)
+    os.makedirs(os.path.dirname(f), exist_ok=True)
+    # note: O_TRUNC already truncates the file when opening it
+    os.close(os.open(f, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
 
 
 def emit_in_main_thread(sender: GObject, signal_name: str, *args) -> None:
     """
     Emit a signal in the main thread.
     """
-    call_in_main_thread(lambda: sender.emit(signal_name, *args))
+    call_in_main_thread(sender.emit, signal_name, *args)
 
 
 ###############################################################################
 # parsers
 ###############################################################################
 
+# the name in a registry specification: a hostname/IPv4 address or a bracketed IPv6 address
+_REGISTRY_NAME_RE = re.compile(r"\A(?:[A-Za-z0-9._-]+|\[[0-9A-Fa-f:.]+\])\Z")
+
+
+@functools.lru_cache(maxsize=128)
 def parse_registry(registry: str) -> Optional[Tuple[str, int]]:
     # verify that the registry specification is valid (ie, something like "registry:5000")
     if len(registry) == 0:
         return None
 
-    try:
-        registry_name, registry_port = registry.split(":")
-    except:
-        raise RegistryInvalidError("invalid format for registry")
+    # note: split at the last ":", so it works for IPv6 addresses like "[::1]:5000"
+    registry_name, sep, registry_port = registry.rpartition(":")
+    if not sep:
+        raise RegistryInvalidError("invalid format for registry: it must be like NAME:PORT")
 
     if len(registry_name) == 0:
         raise RegistryInvalidError("no registry name specified")
@@ -263,6 +485,12 @@ def parse_registry(registry: str) -> Optional[Tuple[str, int]]:
     if len(registry_port) == 0:
         raise RegistryInvalidError("no registry port specified")
 
+    if not (registry_port.isascii() and registry_port.isdigit()) or len(registry_port) > 5:
+        raise RegistryInvalidError("invalid registry port")
+
+    if _REGISTRY_NAME_RE.match(registry_name) is None:
+        raise RegistryInvalidError("invalid registry name")
+
     return registry_name, registry_port
 
 
@@ -25,9 +25,9 @@
 
 import logging
 import random
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, Dict
 
-from gi.repository import GdkPixbuf, Granite, Gtk, Notify as notify
+from gi.repository import GdkPixbuf, Gio, Granite, Gtk, Notify as notify
 
 from .config import APP_TITLE, DEFAULT_NOTIFICATION_TIMEOUT, DEFAULT_NOTIFICATION_ERROR_TIMEOUT
 from .config import ApplicationSettings
@@ -38,6 +38,22 @@ from .utils import call_in_main_thread, running_on_main_thread
 # messages and notyfications
 ###############################################################################
 
+# cache of (file -> decoded icon) for the notifications
+# note: only used from the main thread, so it does not need a lock
+_icon_pixbufs: Dict[str, GdkPixbuf.Pixbuf] = {}
+
+
+def _get_icon_pixbuf(filename: str) -> GdkPixbuf.Pixbuf:
+    """
+    Return the icon in a file, loading it only the first time
+    """
+    pixbuf = _icon_pixbufs.get(filename)
+    if pixbuf is None:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(filename)
+        _icon_pixbufs[filename] = pixbuf
+    return pixbuf
+
+
 def show_notification(msg, header: str = None, icon: str = None,
                       timeout: Optional[int] = None,
                       action: Optional[Tuple[str, Callable]] = None,
@@ -64,14 +80,11 @@ def show_notification(msg, header: str = None, icon: str = None,
         logging.debug(msg)
 
     def do_notify():
-        assert running_on_main_thread()
-
         n = notify.Notification.new(header, msg, icon)
         n.set_app_name(APP_TITLE)
 
         if icon_filename is not None:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file(icon_filename)
-            n.set_icon_from_pixbuf(pixbuf)
+            n.set_icon_from_pixbuf(_get_icon_pixbuf(icon_filename))
 
         # Note that the timeout may be ignored by the server.
         n.set_timeout(t)
@@ -83,13 +96,14 @@ def show_notification(msg, header: str = None, icon: str = None,
 
         n.show()
 
-        if not threaded:  # important: do not return anything if invoked with `call_in_main_thread`
-            return n
+        return n
 
     if threaded:
         call_in_main_thread(do_notify)
         return None
     else:
+        # note: threaded notifications are always run from the main thread by `call_in_main_thread`
+        assert running_on_main_thread()
         return do_notify()
 
 
@@ -133,6 +147,7 @@ def _link_gtk_entry_to_settings(settings: ApplicationSettings, entry: Gtk.Entry,
     Link a Gtk.Entry to a GSettings ID, so any change in one of
     them will be reflected in the other one.
     """
+    # note: this cannot be a GSettings.bind() as we must strip the quotes (see `get_safe_string()`)
     name = entry.get_name()
     logging.debug(f"[LINK] settings::{settings_id} <-> entry {name} [str]")
     curr_value = settings.get_safe_string(settings_id)
@@ -152,14 +167,7 @@ def _link_gtk_switch_to_settings(settings: ApplicationSettings, switch: Gtk.Swit
     """
     name = switch.get_name()
     logging.debug(f"[LINK] settings::{settings_id} <-> switch {name} [bool]")
-    curr_value = settings.get_boolean(settings_id)
-    if curr_value:
-        switch.set_state(curr_value)
-
-    settings.connect(f"changed::{settings_id}",
-                     lambda s, k: switch.set_state(settings.get_boolean(settings_id)))
-    switch.connect("state-set",
-                   lambda _sw, _state: settings.set_boolean(settings_id, _state))
+    settings.bind(settings_id, switch, "active", Gio.SettingsBindFlags.DEFAULT)
 
 
 def _link_gtk_spinbutton_to_settings(settings: ApplicationSettings, spin: Gtk.SpinButton, settings_id: str):
@@ -169,18 +177,15 @@ def _link_gtk_spinbutton_to_settings(settings: ApplicationSettings, spin: Gtk.Sp
     """
     name = spin.get_name()
     logging.debug(f"[LINK] settings::{settings_id} <-> spinbutton {name} [int]")
-    curr_value = settings.get_int(settings_id)
-    if curr_value:
-        spin.set_value(settings.get_int(settings_id))
-
-    settings.connect(f"changed::{settings_id}",
-                     lambda s, k: spin.set_value(settings.get_int(settings_id)))
-    spin.connect("change-value",
-                 lambda e: settings.set_int(settings_id, spin.get_value()))
+    settings.bind(settings_id, spin, "value", Gio.SettingsBindFlags.DEFAULT)
 
 
 def _link_gtk_combobox_to_settings(settings: ApplicationSettings, combo: Gtk.ComboBox, settings_id: str):
     def combo_changed(*args):
+        if isinstance(combo, Gtk.ComboBoxText):
+            settings.set_string(settings_id, combo.get_active_text() or "")
+            return
+
         tree_iter = combo.get_active_iter()
         if tree_iter is not None:
             model = combo.get_model()
@@ -190,25 +195,41 @@ def _link_gtk_combobox_to_settings(settings: ApplicationSettings, combo: Gtk.Com
             text = entry.get_text()
         settings.set_string(settings_id, text)
 
+    # map of (text -> row) in the model, rebuilt after any change in the model
+    index_map = None
+
+    def model_changed(*args):
+        nonlocal index_map
+        index_map = None
+
     def settings_changed(*args):
+        nonlocal index_map
         value = settings.get_safe_string(settings_id)
         if value is None or value == "":
             combo.set_active(0)
-        else:
-            model = combo.get_model()
-            for i in range(0, len(model)):
-                text = model[i][0]
-                if text == value:
-                    combo.set_active(i)
-                    return
-            entry = combo.get_child()
-            if hasattr(entry, "set_text"):
-                entry.set_text(value)
+            return
+
+        if index_map is None:
+            index_map = {}
+            for i, row in enumerate(combo.get_model()):
+                index_map.setdefault(row[0], i)
+
+        i = index_map.get(value)
+        if i is not None:
+            combo.set_active(i)
+            return
+
+        entry = combo.get_child()
+        if hasattr(entry, "set_text"):
+            entry.set_text(value)
 
     name = combo.get_name()
     logging.debug(f"[LINK] settings::{settings_id} <-> combo {name} [str]")
+    model = combo.get_model()
+    for signal in ("row-inserted", "row-deleted", "row-changed"):
+        model.connect(signal, model_changed)
     settings_changed()
-    settings.connect(f"changed::{settings_id}", lambda s, k: settings_changed)
+    settings.connect(f"changed::{settings_id}", settings_changed)
     combo.connect("changed", combo_changed)
 
 
@@ -239,33 +260,80 @@ class SettingsPage(Granite.SimpleSettingsPage):
     A settings page, with some convenience functions.
     """
 
-    # settings that will be reset when calling set_defaults()
-    _managed_settings = []
+    # widgets linked to settings, as {setting: name of the widget attribute}
+    # all these settings will be reset when calling set_defaults(), except the `_unmanaged_settings`
+    _settings_widgets = {}
+    _unmanaged_settings = frozenset()
+
+    # validate the page on every "Apply", even when its settings have not changed
+    validate_always = False
 
     def __init__(self, settings: ApplicationSettings, **kwargs):
         self._settings = settings
         super().__init__(**kwargs)
 
         self._entries = []
+        self._linked_settings = set()
+        self._settings_changed_id = None
+        # True when some setting in the page has changed since the last successful validation
+        self.dirty = True
         self._entries_area = self.get_content_area()
         self._entries_area.set_halign(Gtk.Align.FILL)
         self._entries_area.set_hexpand(True)
 
-    def append_entry(self, label, widget, setting=None):
+    def append_entry(self, label, widget):
         # attach to the grid (see https://python-gtk-3-tutorial.readthedocs.io/en/latest/layout.html#grid)
         count = len(self._entries)
         self._entries_area.attach(label, 0, count, 1, 1)
         self._entries_area.attach(widget, 1, count, 1, 1)
         self._entries.append(widget)
-        if setting:
-            link_widget_to_settings(self._settings, widget, setting)
 
-    def append_labeled_entry(self, text, widget, setting=None):
-        label = Gtk.Label(text)
-        label.props.hexpand = False
-        label.props.halign = Gtk.Align.END
+    def finalize(self):
+        """
+        Link all the widgets in `_settings_widgets` to their settings, in one pass.
+        Must be called once all the widgets in the page have been built.
+        """
+        for setting, attr in self._settings_widgets.items():
+            link_widget_to_settings(self._settings, getattr(self, attr), setting)
+            self._linked_settings.add(setting)
+
+        if self._linked_settings and not self._settings_changed_id:
+            self._settings_changed_id = self._settings.connect("changed", self.on_setting_changed)
+
+    def on_setting_changed(self, settings, key):
+        if key in self._linked_settings:
+            self.dirty = True
+
+    def append_labeled_entry(self, text, widget):
+        """
+        Append a widget with a label. The label can be some text or a (prebuilt) Gtk.Label.
+        """
+        if isinstance(text, Gtk.Label):
+            label = text
+        else:
+            label = Gtk.Label(text)
+            label.props.hexpand = False
+            label.props.halign = Gtk.Align.END
         widget.props.halign = Gtk.Align.START
-        self.append_entry(label, widget, setting=setting)
+        self.append_entry(label, widget)
+
+    def on_build(self):
+        """
+        Build the widgets in the page. Called only once, when the page is shown for the first time.
+        """
+        pass
+
+    def on_load(self):
+        """
+        Load the contents that are expensive to obtain. Called only once, when the page is shown for the first time.
+        """
+        pass
+
+    def on_prefetch(self, callback):
+        """
+        Obtain (asynchronously) anything needed for validating the settings, invoking `callback` when done.
+        """
+        callback()
 
     def on_validate(self):
         """
@@ -283,6 +351,9 @@ class SettingsPage(Granite.SimpleSettingsPage):
         """
         Set all the settings to the default values.
         """
-        for setting in self._managed_settings:
+        for setting in self._settings_widgets:
+            if setting in self._unmanaged_settings:
+                continue
             logging.debug(f"[UI] Resetting {setting} to default value")
             self._settings.reset(setting)
+        self.dirty = True